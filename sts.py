@@ -1,61 +1,195 @@
-import random
-from itertools import chain, combinations
+from enum import IntEnum
+from functools import lru_cache
 
-import matplotlib.pyplot as plt
 import numpy as np
-from PIL import Image
 
 
-class Card:
-    def __init__(self, name, energy, damage=0, block=0, vulnerable=0, card_type=None):
-        self.name = name
-        self.energy = energy
-        self.damage = damage
-        self.block = block
-        self.vulnerable = vulnerable
-        self.type = card_type
+# Card type flags
+ATTACK, SKILL, POWER = 1, 2, 4
+
+# Card stats, indexed by Card code. Per-card lookups use the tuples,
+# which are much cheaper to index with a scalar than the numpy arrays
+_ENERGY = (1, 1, 2)
+_DAMAGE = (6, 0, 8)
+_BLOCK = (0, 5, 0)
+_VULN = (0, 0, 2)
+_TYPE = (ATTACK, SKILL, ATTACK)
+
+# The same stats as arrays, for the vectorized and compiled simulations
+ENERGY = np.array(_ENERGY, dtype=np.int8)
+DAMAGE = np.array(_DAMAGE, dtype=np.int8)
+BLOCK = np.array(_BLOCK, dtype=np.int8)
+VULN = np.array(_VULN, dtype=np.int8)
+TYPE = np.array(_TYPE, dtype=np.int8)
+
+
+class Card(IntEnum):
+    STRIKE = 0
+    DEFEND = 1
+    BASH = 2
 
     @classmethod
     def Strike(cls):
-        return cls("Strike", energy=1, damage=6, card_type='Attack')
+        return cls.STRIKE
 
     @classmethod
     def Defend(cls):
-        return cls("Defend", energy=1, block=5, card_type='Skill')
+        return cls.DEFEND
 
     @classmethod
     def Bash(cls):
-        return cls("Bash", energy=2, damage=8, vulnerable=2, card_type='Attack')
+        return cls.BASH
+
+    @classmethod
+    def parse(cls, card):
+        # Accepts a Card or a card name such as 'Strike'
+        if isinstance(card, cls):
+            return card
+        return cls[card.upper()] if isinstance(card, str) else cls(card)
+
+    @property
+    def energy(self):
+        return _ENERGY[self]
+
+    @property
+    def damage(self):
+        return _DAMAGE[self]
+
+    @property
+    def block(self):
+        return _BLOCK[self]
+
+    @property
+    def vulnerable(self):
+        return _VULN[self]
+
+    @property
+    def type(self):
+        return _TYPE[self]
 
     def __repr__(self):
-        return self.name
+        return self.name.title()
+
+    __str__ = __repr__
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+
+
+def _solve(n_strike, n_bash, current_vulnerable, energy, vuln_value):
+    # Best attack plan for a hand holding n_strike Strikes and n_bash Bashes.
+    # Returns (damage, (bashes_played, strikes_played)).
+    # Copies the energy can't pay for never change the plan, so they are
+    # dropped before the cache lookup and never enter the search.
+    n_strike = min(n_strike, energy // _ENERGY[Card.STRIKE])
+    n_bash = min(n_bash, energy // _ENERGY[Card.BASH])
+    return _solve_counts(n_strike, n_bash, bool(current_vulnerable), energy, vuln_value)
+
+
+@lru_cache(maxsize=None)
+def _solve_counts(n_strike, n_bash, current_vulnerable, energy, vuln_value):
+    strike_energy, strike_damage = _ENERGY[Card.STRIKE], _DAMAGE[Card.STRIKE]
+    bash_energy, bash_damage = _ENERGY[Card.BASH], _DAMAGE[Card.BASH]
+    bash_vulnerable = _VULN[Card.BASH]
+
+    # Every (bashes, strikes) plan the energy allows, scored in one pass
+    bashes, strikes = np.meshgrid(
+        np.arange(n_bash + 1), np.arange(n_strike + 1), indexing='ij')
+    bashes, strikes = bashes.ravel(), strikes.ravel()
+    energy_cost = bashes * bash_energy + strikes * strike_energy
+    feasible = energy_cost <= energy
+    bashes, strikes, energy_cost = bashes[feasible], strikes[feasible], energy_cost[feasible]
+
+    # Bashes go first, so the only damage dealt before the enemy is
+    # vulnerable is the first Bash, or every Strike when no Bash is played.
+    # Everything after it gets the 1.5 multiplier.
+    if current_vulnerable:
+        pre_damage = 0
+    else:
+        pre_damage = np.where(bashes > 0, bash_damage, strikes * strike_damage)
+    post_damage = bashes * bash_damage + strikes * strike_damage - pre_damage
+    total_damage = pre_damage + 1.5 * post_damage
+
+    # Calculate future value of new vulnerability
+    future_value = bashes * bash_vulnerable * vuln_value
+
+    # Energy-efficient scoring, preferring plans that use full energy
+    score = (total_damage + future_value) * energy_cost / energy
+
+    best = np.argmax(score)
+    if score[best] <= 0:
+        return 0, (0, 0)
+    return float(total_damage[best]), (int(bashes[best]), int(strikes[best]))
+
+
+@lru_cache(maxsize=None)
+def _plan_table(energy, vuln_value, hand_size=5):
+    # Optimal plan for every hand a deck can draw, keyed by
+    # (strikes, bashes, vulnerable, energy) -> (damage, bashes_played, strikes_played)
+    table = {}
+    for s in range(hand_size + 1):
+        for b in range(hand_size + 1 - s):
+            for vulnerable in (False, True):
+                for e in range(1, energy + 1):
+                    damage, (k_bash, k_strike) = _solve(s, b, vulnerable, e, vuln_value)
+                    table[s, b, vulnerable, e] = (damage, k_bash, k_strike)
+    return table
+
+
+@lru_cache(maxsize=None)
+def _load_card_image(name):
+    from PIL import Image
+
+    return np.asarray(Image.open(f'assets/{name}.jpeg'))
+
+
+def _display_cards(cards, figsize):
+    if len(cards) == 0:
+        return
+
+    import matplotlib.pyplot as plt
+
+    fig, axs = plt.subplots(1, len(cards), figsize=figsize)
+
+    if len(cards) == 1:
+        axs = np.array(axs)
+
+    axs = iter(axs.flatten())
+
+    for card in cards:
+        img = _load_card_image(str(card))
+        ax = next(axs)
+        ax.imshow(img)
+        ax.set_axis_off()
+
+    plt.show()
+
+
+_CARDS = tuple(Card)
 
 
 class Deck:
+    __slots__ = ('cards',)
+
     def __init__(self, n_strike=5, n_defend=4, n_bash=1):
+        # Cards are flyweights, so the deck just repeats the same three
         self.cards = (
-            [Card.Strike() for _ in range(n_strike)] +
-            [Card.Defend() for _ in range(n_defend)] +
-            [Card.Bash() for _ in range(n_bash)]
+            [Card.STRIKE] * n_strike +
+            [Card.DEFEND] * n_defend +
+            [Card.BASH] * n_bash
         )
 
     def display(self):
-        fig, axs = plt.subplots(1, len(self.cards), figsize=(15, 5))
-        axs = iter(axs.flatten())
-
-        for card in self.cards:
-            img = np.asarray(Image.open(f'assets/{card}.jpeg'))
-            ax = next(axs)
-            ax.imshow(img)
-            ax.set_axis_off()
-    
-        plt.show()
-    
+        _display_cards(self.cards, figsize=(15, 5))
+
 
 class DrawPile:
-    def __init__(self, cards):
+    __slots__ = ('rng', 'cards')
+
+    def __init__(self, cards, rng=None):
+        self.rng = np.random.default_rng() if rng is None else rng
         self.cards = cards.copy()
-        random.shuffle(self.cards)
+        self.rng.shuffle(self.cards)
 
     def __repr__(self):
         return str(self.cards)
@@ -66,11 +200,13 @@ class DrawPile:
 
     def reshuffle(self, discard_pile):
         self.cards.extend(discard_pile.cards)
-        random.shuffle(self.cards)
-        discard_pile.cards = []
+        discard_pile.cards.clear()
+        self.rng.shuffle(self.cards)
 
 
 class DiscardPile:
+    __slots__ = ('cards',)
+
     def __init__(self):
         self.cards = []
 
@@ -79,8 +215,12 @@ class DiscardPile:
 
 
 class Hand:
+    __slots__ = ('_counts', '_cards', 'cards_played', 'draw_pile', 'discard_pile')
+
     def __init__(self, draw_pile, discard_pile):
-        self.cards = []
+        # Number of copies of each Card held, indexed by Card code
+        self._counts = [0] * len(_CARDS)
+        self._cards = []
         self.cards_played = []
         self.draw_pile = draw_pile
         self.discard_pile = discard_pile
@@ -88,33 +228,71 @@ class Hand:
     def __repr__(self):
         return str(self.cards)
 
+    @property
+    def cards(self):
+        # Flat view of the hand, rebuilt only after it changes
+        if self._cards is None:
+            self._cards = [card for card, n in zip(_CARDS, self._counts) for _ in range(n)]
+        return self._cards
+
+    @cards.setter
+    def cards(self, cards):
+        self._counts = [0] * len(_CARDS)
+        self._cards = None
+        for card in cards:
+            self._add(card)
+
+    def _add(self, card):
+        self._counts[card] += 1
+        self._cards = None
+
+    def count(self, card):
+        return self._counts[Card.parse(card)]
+
     def draw(self, n=5):
         if len(self.draw_pile.cards) < n:
-            self.cards.extend(self.draw_pile.pop_all())
+            for card in self.draw_pile.pop_all():
+                self._add(card)
             self.draw_pile.reshuffle(self.discard_pile)
     
-        for i in range(n - len(self.cards)):
-            self.cards.append(self.draw_pile.cards.pop())
-
-    def play(self, card_name):
-        # Plays the first card with the given name
-        for card in self.cards:
-            if card.name == card_name:
-                self.cards.remove(card)
-                self.discard_pile.cards.append(card)
-                self.cards_played.append(card)
-                break
+        for i in range(n - sum(self._counts)):
+            self._add(self.draw_pile.cards.pop())
+
+    def discard(self):
+        # Moves the whole hand to the discard pile
+        for card, n in zip(_CARDS, self._counts):
+            if n:
+                self.discard_pile.cards.extend([card] * n)
+        self._counts = [0] * len(_CARDS)
+        self._cards = []
+
+    def play(self, card):
+        # Plays a card, given as a Card or by name
+        card = Card.parse(card)
+        if not self._counts[card]:
+            return None
+
+        self._counts[card] -= 1
+        self._cards = None
+        self.discard_pile.cards.append(card)
+        self.cards_played.append(card)
+        return card
 
 
 class GameState:
-    def __init__(self, deck=None):
+    __slots__ = ('deck', 'rng', 'draw_pile', 'discard_pile', 'hand', 'energy',
+                 'vulnerable_turns', 'turn_count', 'total_attacks',
+                 'avg_attack_damage', 'deck_size', 'expected_attacks_per_turn',
+                 'vuln_value', '_plans')
+
+    def __init__(self, deck=None, rng=None):
 
         if deck is None:
             deck = Deck()
-        else:
-            self.deck = deck
+        self.deck = deck
+        self.rng = np.random.default_rng() if rng is None else rng
 
-        self.draw_pile = DrawPile(deck.cards)
+        self.draw_pile = DrawPile(deck.cards, self.rng)
         self.discard_pile = DiscardPile()
         self.hand = Hand(self.draw_pile, self.discard_pile)
         self.energy = 3
@@ -122,35 +300,22 @@ class GameState:
         self.turn_count = 0
         
         # Precompute deck statistics
-        attacks = [c for c in deck.cards if c.type == 'Attack']
+        attacks = [c for c in deck.cards if c.type & ATTACK]
         self.total_attacks = len(attacks)
         self.avg_attack_damage = sum(c.damage for c in attacks)/self.total_attacks if attacks else 0
         self.deck_size = len(deck.cards)
         self.expected_attacks_per_turn = (self.total_attacks / self.deck_size) * 5
 
-    def _display_pile(self, pile, title):
-        if len(pile.cards) == 0:
-            return
-
-        fig, axs = plt.subplots(1, len(pile.cards), figsize=(12, 5))
-
-        if len(pile.cards) == 1:
-            axs = np.array(axs)
-
-        axs = iter(axs.flatten())
+        # Calculate value of 1 vulnerable turn
+        self.vuln_value = 0.5 * self.avg_attack_damage * self.expected_attacks_per_turn
+        self._plans = _plan_table(self.energy, self.vuln_value)
 
-        for card in pile.cards:
-            img = np.asarray(Image.open(f'assets/{card}.jpeg'))
-            ax = next(axs)
-            ax.imshow(img)
-            ax.set_axis_off()
-    
-        plt.show()
+    def _display_pile(self, pile, title):
+        _display_cards(pile.cards, figsize=(12, 5))
 
     def end_turn(self):
-        self.cards_played = []
-        self.discard_pile.cards.extend(self.hand.cards)
-        self.hand.cards = []
+        self.hand.cards_played = []
+        self.hand.discard()
 
     def display(self):
         print('Draw Pile')
@@ -161,7 +326,7 @@ class GameState:
         self._display_pile(self.discard_pile, "Discard Pile")
 
     def reset(self):
-        self.__init__(self.deck)
+        self.__init__(self.deck, self.rng)
 
     def simulate_turn(self):
         self.turn_count += 1
@@ -179,71 +344,27 @@ class GameState:
         return damage_dealt, best_combo
 
     def play_optimal_attacks(self):
-        attacks = [card for card in self.hand.cards if card.type == 'Attack']
-        best_score = 0
-        best_combo = []
+        n_strike = self.hand.count(Card.STRIKE)
+        n_bash = self.hand.count(Card.BASH)
 
         current_vulnerable = self.vulnerable_turns > 0
 
-        # Calculate value of 1 vulnerable turn
-        vuln_value = 0.5 * self.avg_attack_damage * self.expected_attacks_per_turn
-
-        for combo in chain(*[combinations(attacks, r) for r in range(1, len(attacks)+1)]):
-            # Sort combo: vulnerabilities first, then highest damage/energy
-            sorted_combo = sorted(
-                combo, 
-                key=lambda c: (-c.vulnerable, 
-                               -c.damage/c.energy if c.energy > 0 else 0))
-
-            total_damage = 0
-            temp_vulnerable = self.vulnerable_turns
-            energy_cost = 0
-            active_vulnerable = current_vulnerable
-
-            # Simulate playing cards in optimal order
-            for card in sorted_combo:
-                if energy_cost + card.energy > self.energy:
-                    break
-
-                # Apply damage multiplier
-                multiplier = 1.5 if active_vulnerable else 1.0
-                total_damage += card.damage * multiplier
-
-                # Update vulnerability
-                if card.vulnerable > 0:
-                    temp_vulnerable += card.vulnerable
-                    active_vulnerable = True  # For subsequent cards in this combo
-
-                energy_cost += card.energy
-
-            # Calculate future value of new vulnerability
-            added_vuln = max(temp_vulnerable - self.vulnerable_turns, 0)
-            future_value = added_vuln * vuln_value
-
-            # Energy-efficient scoring
-            energy_ratio = energy_cost / self.energy  # Prefer using full energy
-
-            if (total_damage + future_value) * energy_ratio > best_score:
-                best_score = (total_damage + future_value) * energy_ratio
-                best_combo = sorted_combo
-
-        # Play the best combination
-        final_damage = 0
-        active_vulnerable = current_vulnerable
-        for card in best_combo:
-            if card in self.hand.cards and self.energy >= card.energy:
-                # Apply damage
-                multiplier = 1.5 if active_vulnerable else 1.0
-                final_damage += card.damage * multiplier
-                
-                # Update game state
+        plan = self._plans.get((n_strike, n_bash, current_vulnerable, self.energy))
+        if plan is None:
+            # Off-table hand, e.g. more than 5 cards drawn
+            damage, (k_bash, k_strike) = _solve(
+                n_strike, n_bash, current_vulnerable, self.energy, self.vuln_value)
+            plan = (damage, k_bash, k_strike)
+        final_damage, k_bash, k_strike = plan
+
+        # Play the best combination, vulnerabilities first
+        best_combo = []
+        for card, count in ((Card.BASH, k_bash), (Card.STRIKE, k_strike)):
+            for _ in range(count):
                 self.hand.play(card)
-                self.energy -= card.energy
-                
-                # Update vulnerability
-                if card.vulnerable > 0:
-                    self.vulnerable_turns += card.vulnerable
-                    active_vulnerable = True
+                self.energy -= _ENERGY[card]
+                self.vulnerable_turns += _VULN[card]
+                best_combo.append(card)
 
         return final_damage, best_combo
 
@@ -257,3 +378,174 @@ class GameState:
             cards_played.append(best_combo)
             
         return total_damage, cards_played
+
+
+def _plan_arrays(game, hand_size=5):
+    # game's full-energy plans as [strikes, bashes, vulnerable] lookup arrays
+    damage_table = np.zeros((hand_size + 1, hand_size + 1, 2))
+    bash_table = np.zeros((hand_size + 1, hand_size + 1, 2), dtype=np.int64)
+    for (s, b, v, e), (damage, k_bash, _) in game._plans.items():
+        if e == game.energy:
+            damage_table[s, b, int(v)] = damage
+            bash_table[s, b, int(v)] = k_bash
+    return damage_table, bash_table
+
+
+def simulate_battles_batch(M, n_turns=10, deck=(5, 4, 1), rng=None):
+    # Runs M independent battles in lockstep, one row per battle.
+    # Returns an (M, n_turns) array with the damage dealt each turn.
+    n_strike, n_defend, n_bash = deck
+    rng = np.random.default_rng() if rng is None else rng
+    game = GameState(Deck(n_strike, n_defend, n_bash), rng)
+    hand_size = 5
+    bash_vulnerable = _VULN[Card.BASH]
+    damage_table, bash_table = _plan_arrays(game, hand_size)
+
+    D = n_strike + n_defend + n_bash
+    decks = np.tile(np.array(game.deck.cards, dtype=np.int8), (M, 1))
+    decks = np.take_along_axis(decks, np.argsort(rng.random((M, D)), axis=1), axis=1)
+
+    # Cards left of pos are in the discard pile, the rest is the draw pile
+    pos = np.zeros(M, dtype=int)
+    vulnerable_turns = np.zeros(M, dtype=int)
+    damage = np.zeros((M, n_turns))
+    idx = np.arange(D)
+
+    for turn in range(n_turns):
+        # Not enough cards: keep the rest of the draw pile on top and
+        # shuffle the discard pile in behind it
+        reshuffle = pos + hand_size > D
+        if reshuffle.any():
+            keys = np.where(idx < pos[:, None], rng.random((M, D)), idx - D)
+            keys = np.where(reshuffle[:, None], keys, idx)
+            decks = np.take_along_axis(decks, np.argsort(keys, axis=1), axis=1)
+            pos[reshuffle] = 0
+
+        hand = np.take_along_axis(decks, pos[:, None] + np.arange(hand_size), axis=1)
+        pos += hand_size
+
+        strikes = np.sum(hand == Card.STRIKE, axis=1)
+        bashes = np.sum(hand == Card.BASH, axis=1)
+        vulnerable = (vulnerable_turns > 0).astype(int)
+
+        damage[:, turn] = damage_table[strikes, bashes, vulnerable]
+        vulnerable_turns += bash_table[strikes, bashes, vulnerable] * bash_vulnerable
+        vulnerable_turns = np.maximum(vulnerable_turns - 1, 0)
+
+    return damage
+
+
+def expected_turn_damage(deck=None, vulnerable=False):
+    # Mean damage of a freshly drawn hand, weighting every possible
+    # (strikes, bashes) draw by its hypergeometric probability.
+    # Every turn draws from this same hand distribution, so turns only
+    # differ through whether the enemy is vulnerable.
+    from scipy.stats import multivariate_hypergeom
+
+    if deck is None:
+        deck = Deck()
+
+    game = GameState(deck)
+    hand_size = 5
+    n_strike = deck.cards.count(Card.STRIKE)
+    n_bash = deck.cards.count(Card.BASH)
+    n_other = len(deck.cards) - n_strike - n_bash
+
+    expected = 0
+    for b in range(min(n_bash, hand_size) + 1):
+        for s in range(min(n_strike, hand_size - b) + 1):
+            if hand_size - s - b > n_other:
+                continue
+            p = multivariate_hypergeom.pmf(
+                [s, b, hand_size - s - b], [n_strike, n_bash, n_other], hand_size)
+            damage, _ = _solve(s, b, vulnerable, game.energy, game.vuln_value)
+            expected += p * damage
+
+    return expected
+
+
+@lru_cache(maxsize=None)
+def _battles_kernel():
+    # Compiles the battle kernels on first use, since importing numba costs
+    # more than the rest of the module. Returns None without numba.
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+
+    @njit(cache=True)
+    def simulate_battle(damage, deck_codes, n_turns, damage_table, bash_table,
+                        strike_code, bash_code, bash_vulnerable):
+        # Plays one battle, writing each turn's damage into damage
+        D = deck_codes.shape[0]
+        hand_size = 5
+        pile = deck_codes.copy()
+        np.random.shuffle(pile)
+
+        # Cards left of pos are in the discard pile, the rest is the draw pile
+        pos = 0
+        vulnerable_turns = 0
+        for turn in range(n_turns):
+            if pos + hand_size > D:
+                # Keep the rest of the draw pile on top and
+                # shuffle the discard pile in behind it
+                rest = D - pos
+                discard = pile[:pos].copy()
+                np.random.shuffle(discard)
+                pile[:rest] = pile[pos:].copy()
+                pile[rest:] = discard
+                pos = 0
+
+            strikes = 0
+            bashes = 0
+            for k in range(pos, pos + hand_size):
+                if pile[k] == strike_code:
+                    strikes += 1
+                elif pile[k] == bash_code:
+                    bashes += 1
+            pos += hand_size
+
+            vulnerable = 1 if vulnerable_turns > 0 else 0
+            damage[turn] = damage_table[strikes, bashes, vulnerable]
+            vulnerable_turns += bash_table[strikes, bashes, vulnerable] * bash_vulnerable
+            if vulnerable_turns > 0:
+                vulnerable_turns -= 1
+
+    @njit(parallel=True, cache=True)
+    def simulate_battles(M, deck_codes, seeds, n_turns, damage_table, bash_table,
+                         strike_code, bash_code, bash_vulnerable):
+        # Battles run in blocks with one seed each, so results depend only on
+        # the seeds and not on how blocks are spread over threads. numba
+        # keeps its own random state, so NumPy's global one is left alone.
+        n_blocks = seeds.shape[0]
+        block = (M + n_blocks - 1) // n_blocks
+        damage = np.zeros((M, n_turns))
+
+        for b in prange(n_blocks):
+            np.random.seed(seeds[b])
+            for m in range(b * block, min(M, (b + 1) * block)):
+                simulate_battle(
+                    damage[m], deck_codes, n_turns, damage_table, bash_table,
+                    strike_code, bash_code, bash_vulnerable)
+
+        return damage
+
+    return simulate_battles
+
+
+def simulate_battles_jit(M, n_turns=10, deck=(5, 4, 1), rng=None, block=4096):
+    # Same as simulate_battles_batch, but each battle runs as a compiled
+    # loop. Without numba this falls back to simulate_battles_batch.
+    # Returns an (M, n_turns) damage array.
+    kernel = _battles_kernel()
+    if kernel is None:
+        return simulate_battles_batch(M, n_turns, deck, rng)
+
+    rng = np.random.default_rng() if rng is None else rng
+    game = GameState(Deck(*deck), rng)
+    damage_table, bash_table = _plan_arrays(game)
+    seeds = rng.integers(2**31, size=max(1, -(-M // block)))
+
+    return kernel(
+        M, np.array(game.deck.cards, dtype=np.int8), seeds, n_turns,
+        damage_table, bash_table, int(Card.STRIKE), int(Card.BASH), _VULN[Card.BASH])